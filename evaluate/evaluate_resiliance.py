@@ -6,29 +6,113 @@ from enum import Enum
 from pathlib import Path
 from typing import Set, Union, List
 
-import matplotlib.patches as mpatches
 import matplotlib.ticker as mtick
 import numpy as np
-import tikzplotlib
 from matplotlib import pyplot as plt
 
 from utils import EvaluationUtils, InjectMode, PathUtils
 
+try:
+    from numba import njit
+
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+try:
+    from joblib import Parallel, delayed
+
+    _HAS_JOBLIB = True
+except ImportError:
+    _HAS_JOBLIB = False
+
+if _HAS_NUMBA:
+
+    @njit(cache=True, fastmath=True)
+    def mean_std_band(rewards, offset, scale):
+        # Single-pass Welford reduction of (rewards + offset) / scale over axis=1
+        n_rows, n_cols = rewards.shape
+        means = np.empty(n_rows)
+        stds = np.empty(n_rows)
+        for r in range(n_rows):
+            mean = 0.0
+            m2 = 0.0
+            for c in range(n_cols):
+                x = (rewards[r, c] + offset) / scale
+                delta = x - mean
+                mean += delta / (c + 1)
+                m2 += delta * (x - mean)
+            means[r] = mean
+            stds[r] = np.sqrt(m2 / n_cols)
+        return means, stds
+
+else:
+
+    def mean_std_band(rewards, offset, scale):
+        scaled = (rewards + offset) / scale
+        return scaled.mean(axis=1), scaled.std(axis=1)
+
 
 class ResilencePlottinMode(Enum):
     VIOLIN = 1
     PERFORMANCE_MAINTEINED = 2
 
 
-def adjacent_values(vals, q1, q3):
-    upper_adjacent_value = q3 + (q3 - q1) * 1.5
-    upper_adjacent_value = np.clip(upper_adjacent_value, q3, vals[-1])
-
-    lower_adjacent_value = q1 - (q3 - q1) * 1.5
-    lower_adjacent_value = np.clip(lower_adjacent_value, vals[0], q1)
+tex_fonts = {
+    # Use LaTeX to write all text
+    "text.usetex": True,
+    "text.latex.preamble": "\\usepackage{libertine}\n\\usepackage[libertine]{newtxmath}",
+    "font.family": "Linux Libertine",
+    # Use 10pt font in plots, to match 10pt font in document
+    "axes.labelsize": 19,
+    "font.size": 10,
+    # Make the legend/label fonts a little smaller
+    "legend.fontsize": 16,
+    "legend.title_fontsize": 7,
+    "xtick.labelsize": 16,
+    "ytick.labelsize": 16,
+}
+
+_tex_fonts_set = False
+
+
+def set_tex_fonts():
+    # Only touch rcParams once: the first usetex render after a style change
+    # rebuilds the whole LaTeX cache.
+    global _tex_fonts_set
+    if not _tex_fonts_set:
+        plt.rcParams.update(tex_fonts)
+        _tex_fonts_set = True
+
+
+def adjacent_values(vmin, vmax, q1, q3):
+    iqr = q3 - q1
+    upper_adjacent_value = min(max(q3 + iqr * 1.5, q3), vmax)
+    lower_adjacent_value = max(min(q1 - iqr * 1.5, q1), vmin)
     return lower_adjacent_value, upper_adjacent_value
 
 
+if _HAS_NUMBA:
+    adjacent_values = njit(cache=True, fastmath=True)(adjacent_values)
+
+
+_QUARTILE_HIST_THRESHOLD = 5000
+
+
+def adaptive_quartiles(rewards, nbins=1024):
+    """
+    25/50/75 % quantiles via a histogram CDF: one linear pass instead of a
+    full sort, accurate to within a bin width. For small inputs the sort is
+    cheaper, so fall back to np.quantile.
+    """
+    if len(rewards) <= _QUARTILE_HIST_THRESHOLD:
+        return np.quantile(rewards, [0.25, 0.5, 0.75])
+    hist, edges = np.histogram(rewards, bins=nbins)
+    cdf = np.cumsum(hist)
+    ranks = np.array([0.25, 0.5, 0.75]) * cdf[-1]
+    return np.interp(ranks, cdf, edges[1:])
+
+
 def evaluate_resilience(
     checkpoint_paths: List[Union[str, Path]],
     n_episodes_per_model: int,
@@ -48,11 +132,19 @@ def evaluate_resilience(
     :param noise_delta: In case of nosie injection, the action will be the normal action + Uniform(-noise_delta,  noise_delta)
     :param compute_also_non_injected: Wether to run evaluation of non-injected models as well for comparison
     """
+    import matplotlib.patches as mpatches
 
     fig, ax = plt.subplots(figsize=(16, 9))
     rewards_to_plot = []
     labels = []
     x_tick_lkabels = []
+    meds_x = []
+    meds_y = []
+    q1s = []
+    q3s = []
+    whisk_lo = []
+    whisk_hi = []
+    inject_flags = []
     colors = plt.rcParams["axes.prop_cycle"]()
     c1 = next(colors)["color"]
     c2 = next(colors)["color"]
@@ -88,7 +180,7 @@ def evaluate_resilience(
         figure_title = env_title
         figure_name = env_name
 
-        rewards_bef_and_after = []
+        rewards_bef_and_after = np.empty((2, n_episodes_per_model))
 
         for inject in [False, True] if compute_also_non_injected else [True]:
 
@@ -104,61 +196,38 @@ def evaluate_resilience(
                 agents_to_inject=agents_to_inject,
                 noise_delta=noise_delta,
             )
-            rewards_bef_and_after.append(rewards)
+            rewards_bef_and_after[int(inject)] = rewards
 
             if plotting_mode is ResilencePlottinMode.VIOLIN:
-                rewards = sorted(rewards)
-
-                rewards_violin = ax.violinplot(
-                    rewards,
-                    [model_num],
-                    showmeans=False,
-                    showmedians=False,
-                    showextrema=False,
-                )
+                rewards_arr = np.asarray(rewards)
 
-                for pc in rewards_violin["bodies"]:
-                    pc.set_facecolor(c1 if not inject else c2)
-                    # pc.set_edgecolor("black")
-                    pc.set_alpha(0.65)
-
-                quartile1, medians, quartile3 = np.percentile(rewards, [25, 50, 75])
-                whiskers = np.array([adjacent_values(rewards, quartile1, quartile3)])
-                whiskers_min, whiskers_max = whiskers[:, 0], whiskers[:, 1]
-
-                inds = model_num
-                ax.scatter(
-                    inds,
-                    medians,
-                    marker="o",
-                    color="white",
-                    s=30,
-                    zorder=3,
-                    edgecolors="black",
-                )
-                ax.vlines(inds, quartile1, quartile3, color="k", linestyle="-", lw=5)
-                ax.vlines(
-                    inds, whiskers_min, whiskers_max, color="k", linestyle="-", lw=1
+                quartile1, medians, quartile3 = adaptive_quartiles(rewards_arr)
+                whiskers_min, whiskers_max = adjacent_values(
+                    rewards_arr.min(), rewards_arr.max(), quartile1, quartile3
                 )
 
-                rewards_to_plot.append(rewards)
+                meds_x.append(model_num)
+                meds_y.append(medians)
+                q1s.append(quartile1)
+                q3s.append(quartile3)
+                whisk_lo.append(whiskers_min)
+                whisk_hi.append(whiskers_max)
+                inject_flags.append(inject)
+
+                rewards_to_plot.append(rewards_arr)
                 labels.append(
                     (
-                        mpatches.Patch(
-                            color=rewards_violin["bodies"][0].get_facecolor().flatten()
-                        ),
+                        mpatches.Patch(color=c2 if inject else c1, alpha=0.65),
                         f"{'Injected' if inject else 'Normal'}",
                     )
                 )
 
         if plotting_mode is ResilencePlottinMode.PERFORMANCE_MAINTEINED:
-            mean_before = np.array(rewards_bef_and_after[0]).mean()
-            mean_after = np.array(rewards_bef_and_after[1]).mean()
-            median_before = np.median(np.array(rewards_bef_and_after[0]))
-            median_after = np.median(np.array(rewards_bef_and_after[1]))
+            means = rewards_bef_and_after.mean(axis=1)
+            medians = np.median(rewards_bef_and_after, axis=1)
 
-            mean_perf_after = (mean_after / mean_before) * 100
-            median_perf_after = (median_after / median_before) * 100
+            mean_perf_after = (means[1] / means[0]) * 100
+            median_perf_after = (medians[1] / medians[0]) * 100
 
             mean_point = ax.scatter(
                 model_num, mean_perf_after, marker="o", color=c1, s=100
@@ -182,6 +251,34 @@ def evaluate_resilience(
 
         x_tick_lkabels.append(model_title)
 
+    if plotting_mode is ResilencePlottinMode.VIOLIN and meds_x:
+        # One violinplot call for all models/inject flags: a single KDE setup
+        # and one PolyCollection instead of one per violin.
+        rewards_violin = ax.violinplot(
+            rewards_to_plot,
+            meds_x,
+            showmeans=False,
+            showmedians=False,
+            showextrema=False,
+        )
+        for pc, was_injected in zip(rewards_violin["bodies"], inject_flags):
+            pc.set_facecolor(c2 if was_injected else c1)
+            # pc.set_edgecolor("black")
+            pc.set_alpha(0.65)
+            pc.set_rasterized(True)
+
+        ax.scatter(
+            meds_x,
+            meds_y,
+            marker="o",
+            color="white",
+            s=30,
+            zorder=3,
+            edgecolors="black",
+        )
+        ax.vlines(meds_x, q1s, q3s, color="k", linestyle="-", lw=5)
+        ax.vlines(meds_x, whisk_lo, whisk_hi, color="k", linestyle="-", lw=1)
+
     ax.yaxis.grid(True)
     ax.set_ylabel(
         f"Reward violin with median for {n_episodes_per_model} episodes"
@@ -208,7 +305,45 @@ def evaluate_resilience(
 
     save_dir = PathUtils.result_dir / f"{figure_title}/resilience evaluation"
     name = inject_name
-    plt.savefig(str(save_dir / f"eval_resilience_{name}_{plotting_mode}.pdf"))
+    plt.savefig(str(save_dir / f"eval_resilience_{name}_{plotting_mode}.pdf"), dpi=200)
+
+
+def run_trainer_sweep(
+    checkpoint_path: Union[str, Path],
+    noises: np.ndarray,
+    n_episodes: int,
+    agents_to_inject: Set,
+    inject_mode: InjectMode,
+):
+    """
+    Loads one checkpoint, rolls out all noise deltas against it and releases
+    the trainer; returns the config and the rewards/done rows for that model.
+    """
+    (
+        config,
+        trainer,
+        env,
+    ) = EvaluationUtils.get_config_trainer_and_env_from_checkpoint(checkpoint_path)
+    rews, _, obs_lens, _ = EvaluationUtils.rollout_episodes(
+        n_episodes=n_episodes,
+        render=False,
+        get_obs=False,
+        get_obs_lens=True,
+        get_actions=False,
+        trainer=trainer,
+        env=env,
+        inject=True,
+        inject_mode=inject_mode,
+        agents_to_inject=agents_to_inject,
+        noise_deltas=noises,
+    )
+    done_row = obs_lens < config["env_config"]["max_steps"]
+
+    # Trainers hold model weights and rollout workers; release each one
+    # as soon as its sweep is done to keep peak memory at O(model_size).
+    trainer.stop()
+    del trainer, env
+    return config, rews, done_row
 
 
 def evaluate_increasing_noise(
@@ -224,43 +359,45 @@ def evaluate_increasing_noise(
             len(checkpoint_paths),
             len(noises),
             n_episodes_per_model,
-        )
+        ),
+        dtype=np.float32,
     )
     done = np.zeros(
         (
             len(checkpoint_paths),
             len(noises),
             n_episodes_per_model,
-        )
+        ),
+        dtype=np.int8,
     )
-    trainers = [
-        EvaluationUtils.get_config_trainer_and_env_from_checkpoint(checkpoint_path)[1]
-        for checkpoint_path in checkpoint_paths
-    ]
-    envs = [
-        EvaluationUtils.get_config_trainer_and_env_from_checkpoint(checkpoint_path)[2]
-        for checkpoint_path in checkpoint_paths
-    ]
-    for j, noise in enumerate(noises):
-        for i, trainer in enumerate(trainers):
-            rews, _, obs, _ = EvaluationUtils.rollout_episodes(
-                n_episodes=n_episodes_per_model,
-                render=False,
-                get_obs=True,
-                get_actions=False,
-                trainer=trainer,
-                env=envs[i],
-                inject=True,
-                inject_mode=inject_mode,
-                agents_to_inject=agents_to_inject,
-                noise_delta=noise,
+    if _HAS_JOBLIB and len(checkpoint_paths) > 1:
+        # Each worker loads its own trainer, so the sweeps are embarrassingly
+        # parallel across checkpoints.
+        results = Parallel(n_jobs=-1, backend="loky")(
+            delayed(run_trainer_sweep)(
+                checkpoint_path,
+                noises,
+                n_episodes_per_model,
+                agents_to_inject,
+                inject_mode,
             )
-
-            len_obs = np.array([len(o) for o in obs])
-            rewards[i, j] = rews
-            done[i, j] = (len_obs < trainer.config["env_config"]["max_steps"]).astype(
-                int
+            for checkpoint_path in checkpoint_paths
+        )
+    else:
+        results = [
+            run_trainer_sweep(
+                checkpoint_path,
+                noises,
+                n_episodes_per_model,
+                agents_to_inject,
+                inject_mode,
             )
+            for checkpoint_path in checkpoint_paths
+        ]
+
+    configs = [config for config, _, _ in results]
+    rewards[:] = np.stack([rewards_row for _, rewards_row, _ in results])
+    done[:] = np.stack([done_row for _, _, done_row in results])
 
     fig, ax = plt.subplots(figsize=(5, 5))
     CB_color_cycle = [
@@ -275,39 +412,44 @@ def evaluate_increasing_noise(
         "#dede00",
     ]
     ax.grid()
-    for model_num, trainer in enumerate(trainers):
+    means = np.empty((len(configs), len(noises)))
+    stds = np.empty_like(means)
+    for model_num in range(len(configs)):
+        means[model_num], stds[model_num] = mean_std_band(rewards[model_num], 10.0, 60.0)
+        # means[model_num], stds[model_num] = mean_std_band(done[model_num], 0.0, 1.0)
+    for model_num, config in enumerate(configs):
         (
             model_title,
             model_name,
             env_title,
             env_name,
-        ) = EvaluationUtils.get_model_name(trainer.config)
-
-        to_plot = (rewards + 10) / 60
-        # to_plot = done
+        ) = EvaluationUtils.get_model_name(config)
 
-        mean = to_plot[model_num].mean(1)
-        std = to_plot[model_num].std(1)
+        mean = means[model_num]
+        std = stds[model_num]
         model_title = "HetGPPO" if model_title == "HetGIPPO" else "GPPO"
         (mean_line,) = ax.plot(
             noises, mean, label=model_title, color=CB_color_cycle[model_num]
         )
-        ax.fill_between(
+        band = ax.fill_between(
             noises,
             mean + std,
             mean - std,
             color=mean_line.get_color(),
             alpha=0.3,
         )
+        band.set_rasterized(True)
     ax.set_xlabel("Uniform observation noise")
     ax.set_ylabel("Reward")
     ax.legend()
 
+    import tikzplotlib
+
     tikzplotlib.save(
         f"trial.tex",
         textsize=18,
     )
-    plt.savefig(f"trial.pdf", bbox_inches="tight", pad_inches=0)
+    plt.savefig(f"trial.pdf", bbox_inches="tight", pad_inches=0, dpi=200)
     plt.show()
 
 
@@ -321,22 +463,7 @@ def evaluate_het_test():
         "/Users/Matteo/Downloads/het_test/gippo/MultiPPOTrainer_het_test_18f2c_00000_0_2022-09-12_14-45-00/checkpoint_000116/checkpoint-116"
     )
 
-    tex_fonts = {
-        # Use LaTeX to write all text
-        "text.usetex": True,
-        "text.latex.preamble": "\\usepackage{libertine}\n\\usepackage[libertine]{newtxmath}",
-        "font.family": "Linux Libertine",
-        # Use 10pt font in plots, to match 10pt font in document
-        "axes.labelsize": 19,
-        "font.size": 10,
-        # Make the legend/label fonts a little smaller
-        "legend.fontsize": 16,
-        "legend.title_fontsize": 7,
-        "xtick.labelsize": 16,
-        "ytick.labelsize": 16,
-    }
-
-    plt.rcParams.update(tex_fonts)
+    set_tex_fonts()
 
     evaluate_increasing_noise(
         checkpoint_paths, 100, {0, 1}, InjectMode.OBS_NOISE, ResilencePlottinMode.VIOLIN
@@ -355,22 +482,7 @@ def evaluate_give_way():
         "/Users/Matteo/Downloads/give_way/gippo/MultiPPOTrainer_give_way_5dee1_00000_0_2022-09-12_23-00-52/checkpoint_000300/checkpoint-300"
     )
 
-    tex_fonts = {
-        # Use LaTeX to write all text
-        "text.usetex": True,
-        "text.latex.preamble": "\\usepackage{libertine}\n\\usepackage[libertine]{newtxmath}",
-        "font.family": "Linux Libertine",
-        # Use 10pt font in plots, to match 10pt font in document
-        "axes.labelsize": 19,
-        "font.size": 10,
-        # Make the legend/label fonts a little smaller
-        "legend.fontsize": 16,
-        "legend.title_fontsize": 7,
-        "xtick.labelsize": 16,
-        "ytick.labelsize": 16,
-    }
-
-    plt.rcParams.update(tex_fonts)
+    set_tex_fonts()
 
     evaluate_increasing_noise(
         checkpoint_paths, 100, {0, 1}, InjectMode.OBS_NOISE, ResilencePlottinMode.VIOLIN
@@ -3,12 +3,15 @@
 #  All rights reserved.
 import pickle
 import platform
-from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntEnum
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional, Tuple, Set, Callable
+from typing import Dict, Optional, Tuple, Set, Callable, Sequence
 from typing import Union
 
 import ray
+import torch
 import vmas
 import wandb
 from ray.rllib import RolloutWorker, BaseEnv, Policy, VectorEnv
@@ -41,27 +44,27 @@ class PathUtils:
     rollout_storage = result_dir / "rollout_storage"
 
 
-class InjectMode(Enum):
+class InjectMode(IntEnum):
     ACTION_NOISE = 1
     OBS_NOISE = 2
 
     def is_noise(self):
-        if self is InjectMode.OBS_NOISE or self is InjectMode.ACTION_NOISE:
-            return True
-        return False
+        return self in _NOISE_MODES
 
     def is_obs(self):
-        if self is InjectMode.OBS_NOISE:
-            return True
-        return False
+        return self is InjectMode.OBS_NOISE
 
     def is_action(self):
-        if self is InjectMode.ACTION_NOISE:
-            return True
-        return False
+        return self is InjectMode.ACTION_NOISE
+
+
+_NOISE_MODES = frozenset({InjectMode.ACTION_NOISE, InjectMode.OBS_NOISE})
 
 
 class TrainingUtils:
+    _registered_envs = set()
+    _registered_models = False
+
     @staticmethod
     def init_ray(scenario_name, local_mode: bool = False, num_gpus=None):
         if not ray.is_initialized():
@@ -71,14 +74,22 @@ class TrainingUtils:
                 num_gpus=num_gpus,
             )
             print("Ray init!")
+            # cluster_resources() is a blocking GCS round-trip; only query it
+            # on the init that actually started Ray
+            print(f'Using resources: {ray.cluster_resources()}')
         print(f'Using scenario "{scenario_name}"')
-        print(f'Using resources: {ray.cluster_resources()}')
-        register_env(scenario_name, lambda config: TrainingUtils.env_creator(config))
-        print(f'Using model GPPO', GPPO)
-        ModelCatalog.register_custom_model("GPPO", GPPO)
-        ModelCatalog.register_custom_action_dist(
-            "hom_multi_action", TorchHomogeneousMultiActionDistribution
-        )
+        if scenario_name not in TrainingUtils._registered_envs:
+            register_env(
+                scenario_name, lambda config: TrainingUtils.env_creator(config)
+            )
+            TrainingUtils._registered_envs.add(scenario_name)
+        if not TrainingUtils._registered_models:
+            print(f'Using model GPPO', GPPO)
+            ModelCatalog.register_custom_model("GPPO", GPPO)
+            ModelCatalog.register_custom_action_dist(
+                "hom_multi_action", TorchHomogeneousMultiActionDistribution
+            )
+            TrainingUtils._registered_models = True
 
     @staticmethod
     def env_creator(config: Dict):
@@ -107,12 +118,16 @@ class TrainingUtils:
             **kwargs,
         ):
             info = episode.last_info_for()
-            for a_key in info.keys():
-                for b_key in info[a_key]:
-                    try:
-                        episode.user_data[f"{a_key}/{b_key}"].append(info[a_key][b_key])
-                    except KeyError:
-                        episode.user_data[f"{a_key}/{b_key}"] = [info[a_key][b_key]]
+            user_data = episode.user_data
+            keys = user_data.setdefault("__keys__", {})
+            for a_key, sub_info in info.items():
+                for b_key, value in sub_info.items():
+                    key = keys.get((a_key, b_key))
+                    if key is None:
+                        key = keys.setdefault((a_key, b_key), f"{a_key}/{b_key}")
+                    # Keep a running sum instead of a list of per-step values:
+                    # the terminal reduction is a sum anyway
+                    user_data[key] = user_data.get(key, 0.0) + value
 
         def on_episode_end(
             self,
@@ -124,15 +139,21 @@ class TrainingUtils:
             **kwargs,
         ):
             info = episode.last_info_for()
-            for a_key in info.keys():
-                for b_key in info[a_key]:
-                    metric = np.array(episode.user_data[f"{a_key}/{b_key}"])
-                    episode.custom_metrics[f"{a_key}/{b_key}"] = np.sum(metric).item()
+            user_data = episode.user_data
+            keys = user_data.get("__keys__", {})
+            for a_key, sub_info in info.items():
+                for b_key in sub_info:
+                    key = keys.get((a_key, b_key), f"{a_key}/{b_key}")
+                    episode.custom_metrics[key] = np.sum(user_data[key]).item()
 
     class RenderingCallbacks(DefaultCallbacks):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
-            self.frames = []
+            # Preallocated (max_steps, H, W, 3) buffer, sized lazily from the
+            # first frame and reused across episodes; falls back to a plain
+            # list when the env does not expose max_steps
+            self.frames = None
+            self.n_frames = 0
 
         def on_episode_step(
             self,
@@ -145,11 +166,22 @@ class TrainingUtils:
         ) -> None:
             # ray.logger.debug("RenderingCallbacks.on_episode_step called")
             try:
-                self.frames.append(base_env.vector_env.try_render_at(mode="rgb_array"))
+                frame = base_env.vector_env.try_render_at(mode="rgb_array")
+                if self.frames is None:
+                    max_steps = getattr(base_env.vector_env.env, "max_steps", None)
+                    self.frames = (
+                        np.empty((max_steps,) + frame.shape, dtype=frame.dtype)
+                        if max_steps is not None
+                        else []
+                    )
+                if isinstance(self.frames, list):
+                    self.frames.append(frame)
+                else:
+                    self.frames[self.n_frames] = frame
+                self.n_frames += 1
             except Exception as e:
                 ray.logger.warning("Exception raised in RenderingCallbacks.on_episode_step callback: %s", e)
                 raise e
-            # self.frames.append(base_env.vector_env.try_render_at(mode="rgb_array"))
 
         def on_episode_end(
             self,
@@ -162,11 +194,16 @@ class TrainingUtils:
         ) -> None:
             # ray.logger.debug("RenderingCallbacks.on_episode_end called")
             try:
-                vid = np.transpose(self.frames, (0, 3, 1, 2))
+                if isinstance(self.frames, list):
+                    vid = np.transpose(self.frames, (0, 3, 1, 2))
+                    self.frames = []
+                else:
+                    # Stride change only, no copy of the frame data
+                    vid = self.frames[: self.n_frames].transpose(0, 3, 1, 2)
+                self.n_frames = 0
                 episode.media["rendering"] = wandb.Video(
                     vid, fps=1 / base_env.vector_env.env.world.dt, format="mp4"
                 )
-                self.frames = []
             except Exception as e:
                 ray.logger.warning("Exception raised in RenderingCallbacks.on_episode_end callback: %s", e)
                 raise e
@@ -177,37 +214,54 @@ class EvaluationUtils:
     @staticmethod
     def __inject_noise_in_action(
         agent_actions: tuple,
-        agent_indices: Set[int],
+        agent_indices: np.ndarray,
         noise_delta: float,
-        env: VectorEnv,
+        u_range: np.ndarray,
+        rng: np.random.Generator,
     ) -> Tuple:
         assert len(agent_indices) <= len(agent_actions)
         agent_actions_new = list(agent_actions)
-        for agent_index in agent_indices:
-            noise = np.random.uniform(
-                -noise_delta, noise_delta, size=agent_actions_new[agent_index].shape
-            )
-            agent_actions_new[agent_index] += noise
-            agent_actions_new[agent_index] = np.clip(
-                agent_actions_new[agent_index],
-                -env.env.agents[agent_index].u_range,
-                env.env.agents[agent_index].u_range,
-            )
+        indices = agent_indices
+        if isinstance(agent_actions_new[indices[0]], torch.Tensor):
+            # Stay on the native tensor (and its device): in-place draw, add
+            # and clamp with no numpy round-trip
+            for n, agent_index in enumerate(indices):
+                action = agent_actions_new[agent_index]
+                action.add_(
+                    torch.empty_like(action).uniform_(-noise_delta, noise_delta)
+                )
+                action.clamp_(-u_range[n], u_range[n])
+            return tuple(agent_actions_new)
+        # One stacked (n_agents, action_dim) draw/add/clip instead of one
+        # NumPy call chain per agent
+        stacked = np.stack([agent_actions_new[i] for i in indices])
+        stacked += rng.uniform(-noise_delta, noise_delta, size=stacked.shape)
+        np.clip(stacked, -u_range[:, None], u_range[:, None], out=stacked)
+        for i, row in zip(indices, stacked):
+            agent_actions_new[i] = row
         return tuple(agent_actions_new)
 
     @staticmethod
     def __inject_noise_in_observation(
         observations: tuple,
-        agent_indices: Set[int],
+        agent_indices: np.ndarray,
         noise_delta: float,
+        rng: np.random.Generator,
     ) -> Tuple:
         assert len(agent_indices) <= len(observations)
         observations_new = list(observations)
-        for agent_index in agent_indices:
-            noise = np.random.uniform(
-                -noise_delta, noise_delta, size=observations_new[agent_index].shape
-            )
-            observations_new[agent_index] += noise
+        indices = agent_indices
+        if isinstance(observations_new[indices[0]], torch.Tensor):
+            for agent_index in indices:
+                observation = observations_new[agent_index]
+                observation.add_(
+                    torch.empty_like(observation).uniform_(-noise_delta, noise_delta)
+                )
+            return tuple(observations_new)
+        stacked = np.stack([observations_new[i] for i in indices])
+        stacked += rng.uniform(-noise_delta, noise_delta, size=stacked.shape)
+        for i, row in zip(indices, stacked):
+            observations_new[i] = row
         return tuple(observations_new)
 
     @staticmethod
@@ -217,24 +271,50 @@ class EvaluationUtils:
         agents_to_inject: Set,
         env: VectorEnv,
     ):
-        def inject_function(x):
-            if inject_mode is InjectMode.ACTION_NOISE:
+        if not agents_to_inject:
+            # Nothing to inject: return an identity instead of dispatching
+            # per step
+            return lambda x: x
+
+        # One Generator per inject function: per-instance state, no global
+        # RandomState lock, and faster small-array draws
+        rng = np.random.default_rng()
+        # Sort and convert the inject set once: the helpers iterate/index a
+        # C-contiguous intp array instead of an unordered Python set
+        inject_indices = np.fromiter(sorted(agents_to_inject), dtype=np.intp)
+        # u_range is static across an episode; resolve the attribute chain
+        # once instead of per step
+        u_range = np.array([env.env.agents[i].u_range for i in inject_indices])
+
+        # inject_mode is fixed for the lifetime of the closure, so branch here
+        # once instead of on every call
+        if inject_mode is InjectMode.ACTION_NOISE:
+
+            def inject_function(x):
                 return EvaluationUtils.__inject_noise_in_action(
-                    x, agent_indices=agents_to_inject, noise_delta=noise_delta, env=env
+                    x,
+                    agent_indices=inject_indices,
+                    noise_delta=noise_delta,
+                    u_range=u_range,
+                    rng=rng,
                 )
-            elif inject_mode is InjectMode.OBS_NOISE:
+
+        elif inject_mode is InjectMode.OBS_NOISE:
+
+            def inject_function(x):
                 return EvaluationUtils.__inject_noise_in_observation(
-                    x, noise_delta=noise_delta, agent_indices=agents_to_inject
+                    x, noise_delta=noise_delta, agent_indices=inject_indices, rng=rng
                 )
-            else:
-                assert False
+
+        else:
+            assert False
 
         return inject_function
 
     @staticmethod
     def get_checkpoint_config(checkpoint_path: Union[str, Path]):
         params_path = Path(checkpoint_path).parent / "params.pkl"
-        with open(params_path, "rb") as f:
+        with params_path.open("rb") as f:
             config = pickle.load(f)
         return config
 
@@ -283,29 +363,36 @@ class EvaluationUtils:
         get_obs: bool,
         get_actions: bool,
         trainer: MultiPPOTrainer,
-        action_callback,
         env: VectorEnv,
         inject: bool,
         inject_mode: InjectMode,
         agents_to_inject: Set,
-        noise_delta: float,
+        noise_delta: float = None,
+        action_callback=None,
+        noise_deltas: Sequence[float] = None,
+        get_obs_lens: bool = False,
     ):
+        """
+        When ``noise_deltas`` is given, all deltas are rolled out within one env
+        lifecycle and ``rewards`` comes back as a ``(len(noise_deltas), n_episodes)``
+        array (``observations``/``actions`` gain a leading per-delta list level).
+        Otherwise the single-delta return types are unchanged.
+
+        ``get_obs_lens`` returns episode step counts (an int array) in the
+        observations slot without keeping the observation traces in memory;
+        it is mutually exclusive with ``get_obs``.
+        """
+        assert not (get_obs and get_obs_lens)
         assert (trainer is None) != (action_callback is None)
 
         if trainer is not None:
-            print(
-                f"\nLoaded: {EvaluationUtils.get_model_name(trainer.config)[0]}, {EvaluationUtils.get_model_name(trainer.config)[2]}"
-            )
-        if inject:
-            print(
-                f"Injected: {EvaluationUtils.get_inject_name(inject_mode=inject_mode, agents_to_inject=agents_to_inject, noise_delta=noise_delta)[0]}"
-            )
-            inject_function = EvaluationUtils.get_inject_function(
-                inject_mode,
-                agents_to_inject=agents_to_inject,
-                noise_delta=noise_delta,
-                env=env,
+            model_title, _, env_title, _ = EvaluationUtils.get_model_name(
+                trainer.config
             )
+            print(f"\nLoaded: {model_title}, {env_title}")
+
+        noise_sweep = noise_deltas is not None
+        deltas = noise_deltas if noise_sweep else [noise_delta]
 
         # (
         #     rewards,
@@ -338,55 +425,192 @@ class EvaluationUtils:
         rewards = []
         observations = []
         actions = []
-        for j in range(n_episodes):
-            frame_list = []
-            observations_this_episode = []
-            actions_this_episode = []
-            reward_sum = 0
-            observation = env.vector_reset()[0]
-            i = 0
-            done = False
-            if render:
-                frame_list.append(env.try_render_at(mode="rgb_array"))
-            while not done:
-                i += 1
-                if inject and inject_mode.is_obs():
-                    observation = inject_function(observation)
-                if get_obs:
-                    observations_this_episode.append(observation)
-
-                if trainer is not None:
-                    action = trainer.compute_single_action(observation)
-                else:
-                    action = action_callback(observation)
-
-                if inject and inject_mode.is_action():
-                    action = inject_function(action)
-                if get_actions:
-                    actions_this_episode.append(action)
-                obss, rews, ds, infos = env.vector_step([action])
-                observation = obss[0]
-                reward = rews[0]
-                done = ds[0]
-                info = infos[0]
-                reward_sum += reward
-                if render:
-                    frame_list.append(env.try_render_at(mode="rgb_array"))
-            print(f"Episode: {j + 1}, total reward: {reward_sum}")
-            rewards.append(reward_sum)
-            if reward_sum > best_reward:
-                best_reward = reward_sum
-                best_gif = frame_list.copy()
-            if get_obs:
-                observations.append(observations_this_episode)
-            if get_actions:
-                actions.append(actions_this_episode)
-        print(
-            f"Max reward: {np.max(rewards)}\nReward mean: {np.mean(rewards)}\nMin reward: {np.min(rewards)}"
-        )
+        num_envs = getattr(env, "num_envs", 1)
+        max_steps_env = getattr(getattr(env, "env", None), "max_steps", None)
+        do_inject_obs = inject and inject_mode.is_obs()
+        do_inject_act = inject and inject_mode.is_action()
+        # Frames are rendered on a background thread so the render of the
+        # current state overlaps with the next policy forward; the future is
+        # collected before the env state is mutated again
+        render_pool = ThreadPoolExecutor(max_workers=1) if render else None
+        for delta in deltas:
+            if inject:
+                print(
+                    f"Injected: {EvaluationUtils.get_inject_name(inject_mode=inject_mode, agents_to_inject=agents_to_inject, noise_delta=delta)[0]}"
+                )
+                inject_function = EvaluationUtils.get_inject_function(
+                    inject_mode,
+                    agents_to_inject=agents_to_inject,
+                    noise_delta=delta,
+                    env=env,
+                )
+            rewards_this_delta = []
+            observations_this_delta = []
+            actions_this_delta = []
+            if num_envs > 1:
+                # Batched path: one policy forward per step for all envs
+                # instead of num_envs sequential single-sample forwards
+                assert not render, "Rendering requires num_envs == 1"
+                while len(rewards_this_delta) < n_episodes:
+                    observation_batch = list(env.vector_reset())
+                    reward_sums = np.zeros(num_envs)
+                    step_counts = np.zeros(num_envs, dtype=np.int64)
+                    obs_per_env = [[] for _ in range(num_envs)]
+                    actions_per_env = [[] for _ in range(num_envs)]
+                    active = np.ones(num_envs, dtype=bool)
+                    while active.any():
+                        if do_inject_obs:
+                            observation_batch = [
+                                inject_function(o) for o in observation_batch
+                            ]
+                        step_counts[active] += 1
+                        if get_obs:
+                            for e in np.flatnonzero(active):
+                                obs_per_env[e].append(observation_batch[e])
+
+                        if trainer is not None:
+                            action_dict = trainer.compute_actions(
+                                dict(enumerate(observation_batch))
+                            )
+                            action_batch = [action_dict[e] for e in range(num_envs)]
+                        else:
+                            action_batch = [
+                                action_callback(o) for o in observation_batch
+                            ]
+
+                        if do_inject_act:
+                            action_batch = [inject_function(a) for a in action_batch]
+                        if get_actions:
+                            for e in np.flatnonzero(active):
+                                actions_per_env[e].append(action_batch[e])
+                        obss, rews, ds, infos = env.vector_step(action_batch)
+                        observation_batch = list(obss)
+                        reward_sums[active] += np.asarray(rews)[active]
+                        active &= ~np.asarray(ds, dtype=bool)
+                    for e in range(num_envs):
+                        if len(rewards_this_delta) >= n_episodes:
+                            break
+                        print(
+                            f"Episode: {len(rewards_this_delta) + 1}, total reward: {reward_sums[e]}"
+                        )
+                        rewards_this_delta.append(reward_sums[e])
+                        best_reward = max(best_reward, reward_sums[e])
+                        if get_obs:
+                            observations_this_delta.append(obs_per_env[e])
+                        elif get_obs_lens:
+                            observations_this_delta.append(step_counts[e])
+                        if get_actions:
+                            actions_this_delta.append(actions_per_env[e])
+            else:
+                for j in range(n_episodes):
+                    frame_list = []
+                    observations_this_episode = []
+                    actions_this_episode = []
+                    reward_sum = 0
+                    observation = env.vector_reset()[0]
+                    # Contiguous per-episode buffers indexed by step instead of
+                    # growing Python lists; lists stay as the fallback when
+                    # max_steps is unknown or the per-agent shapes are ragged
+                    obs_buf = None
+                    act_buf = None
+                    if get_obs and max_steps_env is not None:
+                        first_obs = np.asarray(observation)
+                        if first_obs.dtype != object:
+                            obs_buf = np.empty(
+                                (max_steps_env,) + first_obs.shape,
+                                dtype=first_obs.dtype,
+                            )
+                    i = 0
+                    done = False
+                    if render:
+                        pending_frame = render_pool.submit(
+                            env.try_render_at, mode="rgb_array"
+                        )
+                    while not done:
+                        i += 1
+                        if do_inject_obs:
+                            observation = inject_function(observation)
+                        if get_obs:
+                            if obs_buf is not None:
+                                obs_buf[i - 1] = observation
+                            else:
+                                observations_this_episode.append(observation)
+
+                        if trainer is not None:
+                            action = trainer.compute_single_action(observation)
+                        else:
+                            action = action_callback(observation)
+
+                        if do_inject_act:
+                            action = inject_function(action)
+                        if get_actions:
+                            if act_buf is None and max_steps_env is not None and i == 1:
+                                first_act = np.asarray(action)
+                                if first_act.dtype != object:
+                                    act_buf = np.empty(
+                                        (max_steps_env,) + first_act.shape,
+                                        dtype=first_act.dtype,
+                                    )
+                            if act_buf is not None:
+                                act_buf[i - 1] = action
+                            else:
+                                actions_this_episode.append(action)
+                        if render:
+                            frame_list.append(pending_frame.result())
+                        obss, rews, ds, infos = env.vector_step([action])
+                        observation = obss[0]
+                        reward = rews[0]
+                        done = ds[0]
+                        info = infos[0]
+                        reward_sum += reward
+                        if render:
+                            pending_frame = render_pool.submit(
+                                env.try_render_at, mode="rgb_array"
+                            )
+                    if render:
+                        frame_list.append(pending_frame.result())
+                    print(f"Episode: {j + 1}, total reward: {reward_sum}")
+                    rewards_this_delta.append(reward_sum)
+                    if reward_sum > best_reward:
+                        best_reward = reward_sum
+                        # frame_list is rebuilt next episode, so a reference
+                        # swap avoids copying a list of full frames
+                        best_gif = frame_list
+                    if get_obs:
+                        observations_this_delta.append(
+                            obs_buf[:i] if obs_buf is not None else observations_this_episode
+                        )
+                    elif get_obs_lens:
+                        observations_this_delta.append(i)
+                    if get_actions:
+                        actions_this_delta.append(
+                            act_buf[:i] if act_buf is not None else actions_this_episode
+                        )
+            print(
+                f"Max reward: {np.max(rewards_this_delta)}\nReward mean: {np.mean(rewards_this_delta)}\nMin reward: {np.min(rewards_this_delta)}"
+            )
+            rewards.append(rewards_this_delta)
+            observations.append(
+                np.asarray(observations_this_delta, dtype=np.int64)
+                if get_obs_lens
+                else observations_this_delta
+            )
+            actions.append(actions_this_delta)
+
+        if render_pool is not None:
+            render_pool.shutdown()
+
+        if noise_sweep:
+            rewards = np.asarray(rewards)
+            if get_obs_lens:
+                observations = np.asarray(observations)
+        else:
+            rewards = rewards[0]
+            observations = observations[0]
+            actions = actions[0]
 
         best_gif = best_gif if render else None
-        observations = observations if get_obs else None
+        observations = observations if get_obs or get_obs_lens else None
         actions = actions if get_actions else None
 
         # EvaluationUtils.__store_pickled_rollout(
@@ -444,13 +668,17 @@ class EvaluationUtils:
         observations_file = PathUtils.rollout_storage / f"obs_{name}.pkl"
         actions_file = PathUtils.rollout_storage / f"acts_{name}.pkl"
 
-        pickle.dump(rewards, open(reward_file, "wb"))
+        with reward_file.open("wb", buffering=1 << 20) as f:
+            pickle.dump(rewards, f, protocol=pickle.HIGHEST_PROTOCOL)
         if best_gif is not None:
-            pickle.dump(best_gif, open(best_gif_file, "wb"))
+            with best_gif_file.open("wb", buffering=1 << 20) as f:
+                pickle.dump(best_gif, f, protocol=pickle.HIGHEST_PROTOCOL)
         if observations is not None:
-            pickle.dump(observations, open(observations_file, "wb"))
+            with observations_file.open("wb", buffering=1 << 20) as f:
+                pickle.dump(observations, f, protocol=pickle.HIGHEST_PROTOCOL)
         if actions is not None:
-            pickle.dump(actions, open(actions_file, "wb"))
+            with actions_file.open("wb", buffering=1 << 20) as f:
+                pickle.dump(actions, f, protocol=pickle.HIGHEST_PROTOCOL)
 
     @staticmethod
     def __get_pickled_rollout(
@@ -500,28 +728,23 @@ class EvaluationUtils:
             return rewards, best_gif, observations, actions
 
         if reward_file.is_file():
-            rewards = pickle.load(open(reward_file, "rb"))
+            with reward_file.open("rb", buffering=1 << 20) as f:
+                rewards = pickle.load(f)
             if render:
-                best_gif = pickle.load(open(best_gif_file, "rb"))
+                with best_gif_file.open("rb", buffering=1 << 20) as f:
+                    best_gif = pickle.load(f)
             if get_obs:
-                observations = pickle.load(open(observations_file, "rb"))
+                with observations_file.open("rb", buffering=1 << 20) as f:
+                    observations = pickle.load(f)
             if get_actions:
-                actions = pickle.load(open(actions_file, "rb"))
+                with actions_file.open("rb", buffering=1 << 20) as f:
+                    actions = pickle.load(f)
 
         return rewards, best_gif, observations, actions
 
     @staticmethod
-    def get_model_name(config):
-
-        # Model
-        is_hetero = config["model"]["custom_model_config"]["heterogeneous"]
-        is_gippo = config["model"]["custom_model_config"]["share_observations"]
-
-        # Env
-        env_config = config["env_config"]
-        scenario_name = env_config["scenario_name"]
-        scenario_config = env_config["scenario_config"]
-
+    @lru_cache(maxsize=32)
+    def _model_name_from_fields(is_hetero, is_gippo, scenario_name):
         model_title = f"{'Het' if is_hetero else ''}{'GIPPO' if is_gippo else 'IPPO'}"
         model_name = model_title.lower().replace(" ", "_")
 
@@ -530,28 +753,48 @@ class EvaluationUtils:
 
         return model_title, model_name, env_title, env_name
 
+    @staticmethod
+    def get_model_name(config):
+        # Memoized on the hashable fields: this runs in the rollout logging
+        # hot path, so skip re-formatting per call
+        return EvaluationUtils._model_name_from_fields(
+            config["model"]["custom_model_config"]["heterogeneous"],
+            config["model"]["custom_model_config"]["share_observations"],
+            config["env_config"]["scenario_name"],
+        )
+
     @staticmethod
     def get_inject_name(
         agents_to_inject: Set, inject_mode: InjectMode, noise_delta: float
     ):
         if agents_to_inject is not None and len(agents_to_inject) > 0:
-            noise_title = (
-                f"Agents injected: {agents_to_inject}, Inject mode: {inject_mode.name}"
-                + (
-                    " ($\\pm{}$ uniform noise)".format(noise_delta)
-                    if inject_mode.is_noise()
-                    else ""
-                )
+            return EvaluationUtils._inject_name_from_fields(
+                frozenset(agents_to_inject), inject_mode, noise_delta
             )
+        return "", ""
 
-            noise_name = (
-                f"agents_injected_{agents_to_inject}_inject_mode_{inject_mode.name}"
-                + (
-                    "_{}_delta_noise".format(noise_delta)
-                    if inject_mode.is_noise()
-                    else ""
-                )
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _inject_name_from_fields(
+        agents_to_inject: frozenset, inject_mode: InjectMode, noise_delta: float
+    ):
+        agents_to_inject = set(agents_to_inject)
+        noise_title = (
+            f"Agents injected: {agents_to_inject}, Inject mode: {inject_mode.name}"
+            + (
+                " ($\\pm{}$ uniform noise)".format(noise_delta)
+                if inject_mode.is_noise()
+                else ""
             )
+        )
 
-            return noise_title, noise_name
-        return "", ""
+        noise_name = (
+            f"agents_injected_{agents_to_inject}_inject_mode_{inject_mode.name}"
+            + (
+                "_{}_delta_noise".format(noise_delta)
+                if inject_mode.is_noise()
+                else ""
+            )
+        )
+
+        return noise_title, noise_name